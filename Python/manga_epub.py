@@ -0,0 +1,331 @@
+"""Bundle a folder of manga page scans into an EPUB.
+
+Page files must be named ``<prefix><chapter>_<page>.<ext>``, e.g.
+``ch01_001.jpg``. Pages are grouped into chapters by chapter number and
+the first page doubles as the cover.
+
+Example1: python manga_epub.py ./MyManga
+Example2: python manga_epub.py ./MyManga -o MyManga.epub --title "My Manga" --author "Someone"
+"""
+
+import argparse
+import hashlib
+import io
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache, partial
+from itertools import chain, groupby
+from operator import attrgetter
+from typing import NamedTuple
+
+from ebooklib import epub
+from PIL import Image
+
+try:
+    import mozjpeg_lossless_optimization
+except ImportError:  # optional; --encoder mozjpeg needs it installed
+    mozjpeg_lossless_optimization = None
+
+try:
+    from xxhash import xxh3_64_digest as _digest
+except ImportError:  # xxhash is optional; blake2b is the stdlib fallback
+
+    def _digest(data):
+        return hashlib.blake2b(data, digest_size=8).digest()
+
+_FILENAME_RE = re.compile(r"^([A-Za-z]+)(\d+)_(\d+)\.")
+_CHAPTER_NAME_RE = re.compile(r"([A-Za-z]+)(\d+)")
+_EXT_RE = re.compile(r"\.(?:jpe?g|png|webp)$", re.IGNORECASE)
+
+MAX_SIZE = (1200, 1600)
+JPEG_QUALITY = 60
+
+# The XHTML is ASCII apart from the chapter title, so it is assembled
+# directly as bytes; only the small variable fields get encoded. Styling
+# lives in a real stylesheet item linked from every chapter — ebooklib
+# rebuilds <head> on write and drops inline <style> blocks.
+_HEADER_TEMPLATE = b"""<html>
+<head>
+<title>%s</title>
+</head>
+<body>
+"""
+
+_PAGE_CSS = b"""body { margin: 0; padding: 0; }
+.page { text-align: center; }
+img { max-width: 100%; height: auto; }
+"""
+
+
+@dataclass
+class Ok:
+    value: object
+
+
+@dataclass
+class Err:
+    error: str
+
+
+class ParsedImage(NamedTuple):
+    filename: str
+    prefix: str
+    chapter_num: int
+    page_num: int
+
+
+def parse_and_validate_images(image_files):
+    """Parse page filenames and return them sorted by (chapter, page)."""
+    parsed_images = []
+    for filename in image_files:
+        # Cheap substring check rejects junk files before the regex engine runs.
+        if "_" not in filename or (match := _FILENAME_RE.match(filename)) is None:
+            return Err(f"unrecognized page filename: {filename}")
+        prefix, chapter_str, page_str = match.groups()
+        parsed_images.append(
+            ParsedImage(
+                filename=filename,
+                prefix=prefix,
+                chapter_num=int(chapter_str),
+                page_num=int(page_str),
+            )
+        )
+
+    if not parsed_images:
+        return Err("no page images found")
+
+    prefixes = {p.prefix for p in parsed_images}
+    if len(prefixes) > 1:
+        return Err(f"mixed filename prefixes: {', '.join(sorted(prefixes))}")
+
+    seen = {}
+    for p in parsed_images:
+        other = seen.setdefault((p.chapter_num, p.page_num), p.filename)
+        if other != p.filename:
+            return Err(f"duplicate page: {other} and {p.filename}")
+
+    parsed_images.sort(key=attrgetter("chapter_num", "page_num"))
+    return Ok(parsed_images)
+
+
+@lru_cache(maxsize=None)
+def format_chapter_title(chapter_name, chapter_num):
+    match = _CHAPTER_NAME_RE.match(chapter_name)
+    if match:
+        return f"{match.group(1).capitalize()} {int(match.group(2))}"
+    return f"Chapter {chapter_num}"
+
+
+def create_chapter(book, images, chapter_name, chapter_index):
+    title = format_chapter_title(chapter_name, chapter_index)
+    parts = [_HEADER_TEMPLATE % title.encode("utf-8")]
+    parts.extend(
+        b'    <div class="page"><img src="%s" alt="%s"/></div>\n'
+        % (img_path.encode("utf-8"), img_file.encode("utf-8"))
+        for img_file, img_path in images
+    )
+    parts.append(b"</body>\n</html>")
+
+    chapter = epub.EpubHtml(
+        title=title,
+        file_name=f"chapter_{chapter_index:02d}.xhtml",
+        lang="en",
+    )
+    chapter.content = b"".join(parts)
+    chapter.add_link(href="style/manga.css", rel="stylesheet", type="text/css")
+    book.add_item(chapter)
+    return chapter
+
+
+# Encode buffer reused across pages; each pool worker gets its own copy, so
+# the underlying bytearray grows to the largest page once instead of being
+# reallocated per encode.
+_encode_buf = io.BytesIO()
+
+
+def _process_one(img_path, max_size=MAX_SIZE, encoder="pillow"):
+    """Decode, shrink, and JPEG-encode one page. Runs in worker processes."""
+    with Image.open(img_path) as raw:
+        # Image.open only reads the header, so this probe is cheap: a JPEG
+        # already within the target box passes through with no decode, no
+        # re-encode and no quality loss.
+        if (
+            raw.format == "JPEG"
+            and raw.mode in ("RGB", "L")
+            and raw.width <= max_size[0]
+            and raw.height <= max_size[1]
+        ):
+            with open(img_path, "rb") as f:
+                img_data = f.read()
+            if encoder == "mozjpeg":
+                img_data = mozjpeg_lossless_optimization.optimize(img_data)
+            return img_data
+
+        # Let libjpeg IDCT-downscale during decode; no-op for non-JPEG sources.
+        raw.draft("RGB", max_size)
+        # The JPEG encoder takes RGB, grayscale and draft-decoded YCbCr
+        # directly; only palette/alpha modes need the conversion copy.
+        if raw.mode not in ("RGB", "L", "YCbCr"):
+            img = raw.convert("RGB")
+        else:
+            img = raw.copy()
+    # The raw decode (potentially tens of MB per page, times one per pool
+    # worker) is released here; only img survives into resize and encode.
+    img.thumbnail(max_size, Image.Resampling.BICUBIC)
+    _encode_buf.seek(0)
+    _encode_buf.truncate()
+    # optimize=True roughly doubles encode time for a 1-3% size win;
+    # mozjpeg's lossless pass does the shrinking better when asked for.
+    img.save(_encode_buf, format="JPEG", quality=JPEG_QUALITY)
+    img.close()
+    img_data = _encode_buf.getvalue()
+    if encoder == "mozjpeg":
+        img_data = mozjpeg_lossless_optimization.optimize(img_data)
+    return img_data
+
+
+def create_manga_epub(input_folder, output_path, title, author, encoder="pillow"):
+    if not os.path.isdir(input_folder):
+        return Err(f"not a folder: {input_folder}")
+
+    # scandir avoids a per-entry stat compared to listdir + isfile checks.
+    with os.scandir(input_folder) as it:
+        image_files = [e.name for e in it if e.is_file() and _EXT_RE.search(e.name)]
+
+    match parse_and_validate_images(image_files):
+        case Err(error):
+            return Err(error)
+        case Ok(parsed_images):
+            # Validation guarantees a single prefix across the whole set.
+            common_prefix = parsed_images[0].prefix
+
+    book = epub.EpubBook()
+    book.set_identifier(title)
+    book.set_title(title)
+    book.set_language("en")
+    book.add_author(author)
+    book.add_item(
+        epub.EpubItem(
+            uid="style_manga",
+            file_name="style/manga.css",
+            media_type="text/css",
+            content=_PAGE_CSS,
+        )
+    )
+
+    # Decode+resize+encode is CPU-bound and independent per page; fan it out
+    # across cores and assemble the book serially from the returned bytes.
+    paths = [os.path.join(input_folder, p.filename) for p in parsed_images]
+    total = len(parsed_images)
+    try:
+        return _assemble_book(
+            book, parsed_images, paths, common_prefix, total, encoder, output_path
+        )
+    except OSError as exc:
+        # Unreadable/corrupt pages surface here from the pool workers (PIL's
+        # UnidentifiedImageError is an OSError), as do disk-full writes.
+        return Err(str(exc))
+
+
+def _assemble_book(book, parsed_images, paths, common_prefix, total, encoder, output_path):
+    chapters = []
+    dedup = {}
+    pending_items = []
+
+    with ProcessPoolExecutor() as executor:
+        process_one = partial(_process_one, encoder=encoder)
+        encoded = iter(executor.map(process_one, paths, chunksize=8))
+        # The first page doubles as the cover; peek it here and feed it back
+        # so the hot loop carries no per-page cover branch.
+        first_data = next(encoded)
+        book.set_cover("cover.jpg", first_data, create_page=False)
+        encoded = chain((first_data,), encoded)
+
+        # parsed_images is sorted, so groupby yields each chapter's pages in
+        # one contiguous run; no boundary bookkeeping or trailing flush.
+        idx = 0
+        for chapter_num, group in groupby(parsed_images, key=attrgetter("chapter_num")):
+            chapter_images = []
+            for parsed_img in group:
+                idx += 1
+                img_data = next(encoded)
+
+                # Blank/filler pages are often byte-identical after encoding;
+                # store each distinct payload once and point repeats at it.
+                digest = _digest(img_data)
+                epub_img = dedup.get(digest)
+                if epub_img is None:
+                    img_file = f"{parsed_img.filename.rsplit('.', 1)[0]}.jpg"
+                    epub_img = epub.EpubItem(
+                        uid=f"img_{idx}",
+                        file_name=f"images/{img_file}",
+                        media_type="image/jpeg",
+                        content=img_data,
+                    )
+                    pending_items.append(epub_img)
+                    dedup[digest] = epub_img
+                chapter_images.append((parsed_img.filename, epub_img.file_name))
+
+                # Each write+flush is a syscall; rate-limit so a slow terminal
+                # cannot stall the assembly loop.
+                if idx % 200 == 0 or idx == total:
+                    sys.stderr.write(f"\rProcessed {idx}/{total} images...")
+                    sys.stderr.flush()
+
+            chapter_name = f"{common_prefix}{chapter_num:02d}"
+            chapters.append(
+                create_chapter(book, chapter_images, chapter_name, len(chapters) + 1)
+            )
+
+    # The image items carry explicit uids and media types, so add_item's
+    # per-call guessing is dead weight; append them to the manifest in bulk.
+    book.items.extend(pending_items)
+
+    book.toc = chapters
+    book.add_item(epub.EpubNcx())
+    book.add_item(epub.EpubNav())
+    book.spine = ["nav", *chapters]
+
+    epub.write_epub(output_path, book)
+    return Ok(output_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bundle manga page scans into an EPUB.")
+    parser.add_argument("input_folder", help="folder containing the page images")
+    parser.add_argument("-o", "--output", help="output .epub path (default: <folder>.epub)")
+    parser.add_argument("--title", help="book title (default: folder name)")
+    parser.add_argument("--author", default="Unknown", help="book author")
+    parser.add_argument(
+        "--encoder",
+        choices=("pillow", "mozjpeg"),
+        default="pillow",
+        help="mozjpeg runs a lossless size-optimization pass after encoding",
+    )
+    args = parser.parse_args()
+
+    if args.encoder == "mozjpeg" and mozjpeg_lossless_optimization is None:
+        sys.stderr.write(
+            "error: --encoder mozjpeg needs the mozjpeg-lossless-optimization package\n"
+        )
+        sys.exit(1)
+
+    folder_name = os.path.basename(os.path.abspath(args.input_folder))
+    output_path = args.output or f"{folder_name}.epub"
+    title = args.title or folder_name
+
+    match create_manga_epub(
+        args.input_folder, output_path, title, args.author, encoder=args.encoder
+    ):
+        case Err(error):
+            sys.stderr.write(f"error: {error}\n")
+            sys.exit(1)
+        case Ok(path):
+            sys.stderr.write(f"\nWrote {path}\n")
+
+
+if __name__ == "__main__":
+    main()
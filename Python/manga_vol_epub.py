@@ -0,0 +1,461 @@
+"""Bundle volume-scanned manga pages into an EPUB with a nested TOC.
+
+Page files must be named ``VOL<volume>_<page>.<ext>``, e.g.
+``VOL01_0001.jpg``. A TOML config describes the chapter hierarchy; each
+leaf chapter names the page file it starts at:
+
+    title = "My Manga"
+    author = "Someone"
+    hierarchy_levels = ["Volume", "Chapter"]
+
+    [[chapters]]
+    chapter = 1
+
+        [[chapters.chapters]]
+        chapter = 1
+        start = "VOL01_0001.jpg"
+
+        [[chapters.chapters]]
+        chapter = 2
+        title = "The Turning Point"
+        start = "VOL01_0042.jpg"
+
+Example: python manga_vol_epub.py ./scans book.toml -o MyManga.epub
+"""
+
+import argparse
+import bisect
+import hashlib
+import os
+import re
+import sys
+import tomllib
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, groupby
+from dataclasses import dataclass, field
+from functools import lru_cache, partial
+from operator import itemgetter
+
+# ebooklib and PIL are imported inside the functions that need them: pulling
+# in Pillow's C submodules and lxml just to print --help or reject a bad
+# config costs hundreds of milliseconds of startup.
+
+try:
+    import platformdirs
+except ImportError:  # optional; fall back to the XDG convention
+    platformdirs = None
+
+_VOL_RE = re.compile(r"^VOL(\d+)_(\d+)\.", re.IGNORECASE)
+_EXT_SET = frozenset({"jpeg", "jpg", "png", "webp"})
+
+MAX_SIZE = (1200, 1600)
+JPEG_QUALITY = 60
+
+# Encoded pages are cached by source hash; the signature keeps entries from
+# other target sizes/qualities apart if the constants ever change.
+_CACHE_SIG = f"{MAX_SIZE[0]}x{MAX_SIZE[1]}q{JPEG_QUALITY}"
+
+
+def _default_cache_dir():
+    if platformdirs is not None:
+        return platformdirs.user_cache_dir("ss-manga-epub")
+    return os.path.join(
+        os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+        "ss-manga-epub",
+    )
+
+
+@dataclass
+class Ok:
+    value: object
+
+
+@dataclass
+class Err:
+    error: str
+
+
+@dataclass(slots=True)
+class ChapterNode:
+    chapter: int
+    title: str | None = None
+    start_file: str | None = None
+    children: list["ChapterNode"] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class ParsedImage:
+    filename: str
+    sort_num: int
+    page_num: int
+    chapter_path: tuple[int, ...]
+    chapter_titles: tuple[str | None, ...]
+
+
+def parse_vol_page_filename(filename):
+    """Return (volume, page) from a VOL<num>_<num> filename, or None."""
+    match = _VOL_RE.match(filename)
+    if match is None:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+
+def load_chapter_tree(raw_chapters):
+    """Build ChapterNodes from the parsed [[chapters]] TOML tables."""
+    nodes = []
+    for raw in raw_chapters:
+        nodes.append(
+            ChapterNode(
+                chapter=raw["chapter"],
+                title=raw.get("title"),
+                start_file=raw.get("start"),
+                children=load_chapter_tree(raw.get("chapters", [])),
+            )
+        )
+    return nodes
+
+
+def get_leaf_paths(nodes, current_path=(), current_titles=()):
+    """Collect (chapter_path, chapter_titles, start_file) for every leaf."""
+    leaves = []
+    for node in nodes:
+        # Tuple accumulators: no mutable-default pitfall, and extending a
+        # small tuple is cheaper than copying a list per recursion level.
+        new_path = current_path + (node.chapter,)
+        new_titles = current_titles + (node.title,)
+        if node.children:
+            leaves.extend(get_leaf_paths(node.children, new_path, new_titles))
+        else:
+            leaves.append((new_path, new_titles, node.start_file))
+    return leaves
+
+
+def _parse_all_filenames(filenames):
+    """Batch-parse VOL<num>_<num> names into (filename, volume, page) triples.
+
+    The grammar is fixed, so find/slice/int does the whole directory in one
+    pass without entering the regex engine; anything that deviates comes
+    back as an Err naming the file.
+    """
+    parsed_files = []
+    for name in filenames:
+        us = name.find("_", 3)
+        dot = name.find(".", us + 1)
+        vol = name[3:us]
+        page = name[us + 1 : dot]
+        if name[:3].upper() != "VOL" or not (vol.isdigit() and page.isdigit()):
+            return Err(f"unrecognized page filename: {name}")
+        parsed_files.append((name, int(vol), int(page)))
+    return Ok(parsed_files)
+
+
+def assign_chapters_to_images(image_files, chapter_nodes):
+    """Map every page onto the leaf chapter whose start file precedes it."""
+    match _parse_all_filenames(image_files):
+        case Err(error):
+            return Err(error)
+        case Ok(parsed_files):
+            pass
+
+    if not parsed_files:
+        return Err("no page images found")
+    parsed_files.sort(key=itemgetter(1, 2))
+    for prev, cur in zip(parsed_files, parsed_files[1:]):
+        if prev[1:] == cur[1:]:
+            return Err(f"duplicate page: {prev[0]} and {cur[0]}")
+
+    chapter_lookup = []
+    for ch_path, ch_titles, start_file in get_leaf_paths(chapter_nodes):
+        if start_file is None:
+            return Err(f"chapter {'.'.join(map(str, ch_path))} has no start file")
+        parsed = parse_vol_page_filename(start_file)
+        if parsed is None:
+            return Err(f"unrecognized chapter start file: {start_file}")
+        sort_num, page_num = parsed
+        # Every page in the chapter shares these tuples; interning the
+        # title strings collapses repeated volume/chapter labels too.
+        ch_titles = tuple(
+            sys.intern(t) if isinstance(t, str) else t for t in ch_titles
+        )
+        chapter_lookup.append((sort_num, page_num, ch_path, ch_titles))
+    chapter_lookup.sort(key=itemgetter(0, 1))
+
+    # chapter_lookup is sorted, so the owning chapter is the rightmost
+    # entry whose start does not exceed the page: one bisect per image
+    # instead of a linear scan over every chapter.
+    keys = [(sort_num, page_num) for sort_num, page_num, _, _ in chapter_lookup]
+    parsed_images = []
+    for filename, sort_num, page_num in parsed_files:
+        i = bisect.bisect_right(keys, (sort_num, page_num)) - 1
+        if i < 0:
+            return Err(f"{filename} precedes the first chapter start")
+        _, _, ch_path, ch_titles = chapter_lookup[i]
+        parsed_images.append(ParsedImage(filename, sort_num, page_num, ch_path, ch_titles))
+    return Ok(parsed_images)
+
+
+@lru_cache(maxsize=None)
+def _format_title(path_tuple, levels_tuple, custom_title):
+    if custom_title:
+        return custom_title
+    parts = []
+    for level_name, number in zip(levels_tuple, path_tuple):
+        parts.append(f"{level_name} {number}")
+    return " ".join(parts)
+
+
+def format_chapter_title(chapter_path, hierarchy_levels, custom_title):
+    # Chapters under one volume share most of this formatting; memoize on
+    # hashable keys. hierarchy_levels arrives as a tuple already, so only
+    # the path needs wrapping.
+    return _format_title(tuple(chapter_path), hierarchy_levels, custom_title)
+
+
+def create_chapter(book, images, chapter_path, chapter_titles, hierarchy_levels, chapter_index):
+    from ebooklib import epub
+
+    title = format_chapter_title(chapter_path, hierarchy_levels, chapter_titles[-1])
+    parts = [f"<html>\n<head>\n<title>{title}</title>\n</head>\n<body>\n"]
+    parts.extend(
+        f'    <div class="page"><img src="{img_path}" alt="{img_file}"/></div>\n'
+        for img_file, img_path in images
+    )
+    parts.append("</body>\n</html>")
+
+    chapter = epub.EpubHtml(
+        title=title,
+        file_name=f"chapter_{chapter_index:03d}.xhtml",
+        lang="en",
+    )
+    chapter.content = "".join(parts).encode("utf-8")
+    book.add_item(chapter)
+    return chapter
+
+
+def build_toc_recursive(chapters_with_info, level, hierarchy_levels):
+    """Nest chapters into epub.Sections following their chapter paths."""
+    from ebooklib import epub
+
+    toc = []
+    # Chapters arrive in reading order, so every path prefix is contiguous:
+    # one linear pass groups them without a dict build or a re-sort.
+    for key, group_iter in groupby(chapters_with_info, key=lambda info: info[1][level]):
+        group = list(group_iter)
+        if all(len(path) == level + 1 for _, path, _ in group):
+            toc.extend(chapter for chapter, _, _ in group)
+        else:
+            titles = group[0][2]
+            section_title = titles[level] or format_chapter_title(
+                [key], hierarchy_levels[level:], None
+            )
+            toc.append(
+                (
+                    epub.Section(section_title),
+                    build_toc_recursive(group, level + 1, hierarchy_levels),
+                )
+            )
+    return toc
+
+
+def _encode_image(img_path, cache_dir):
+    """Decode, shrink, and JPEG-encode one page, going through the cache.
+
+    Runs in worker processes; returns the encoded file's path so the
+    parent never holds more than one page's bytes at a time. Repeat runs
+    over the same sources (common while iterating on the chapter config)
+    hit the content-addressed cache and skip Pillow entirely.
+    """
+    from PIL import Image
+
+    # Image.open only parses the header; a JPEG already inside the target
+    # box ships as-is — no decode, no re-encode, no quality loss, and no
+    # cache entry since the source file is its own cache.
+    with Image.open(img_path) as probe:
+        if (
+            probe.format == "JPEG"
+            and probe.mode in ("RGB", "L")
+            and probe.width <= MAX_SIZE[0]
+            and probe.height <= MAX_SIZE[1]
+        ):
+            return img_path
+
+    with open(img_path, "rb") as f:
+        digest = hashlib.file_digest(f, "sha1").hexdigest()
+    cached_path = os.path.join(cache_dir, f"{digest}-{_CACHE_SIG}.jpg")
+    if os.path.exists(cached_path):
+        return cached_path
+
+    with Image.open(img_path) as img:
+        # Let libjpeg IDCT-downscale during decode; no-op for non-JPEG
+        # sources. LANCZOS still does the exact final resize.
+        img.draft("RGB", MAX_SIZE)
+        # Pillow silently falls back to NEAREST when resizing palette
+        # images, which raw-decimates dithered screentones; expand P-mode
+        # before the resize so LANCZOS actually runs. Other non-RGB modes
+        # still convert afterwards, while the buffer is thumbnail-sized.
+        if img.mode == "P":
+            img = img.convert("RGB")
+        img.thumbnail(MAX_SIZE, Image.Resampling.LANCZOS)
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        # The temp name lives next to its final name so the atomic publish
+        # below never crosses filesystems (tempdirs are often tmpfs).
+        out_path = f"{cached_path}.{os.getpid()}.tmp"
+        # optimize=True roughly doubles encode time for a 1-3% size win.
+        img.save(out_path, format="JPEG", quality=JPEG_QUALITY)
+    # Publish into the cache atomically; a torn write must never be a hit.
+    os.replace(out_path, cached_path)
+    return cached_path
+
+
+def create_manga_epub(input_folder, output_path, config):
+    from ebooklib import epub
+
+    class FileBackedItem(epub.EpubItem):
+        """EpubItem whose payload stays on disk until the zip is written."""
+
+        def __init__(self, path, **kwargs):
+            super().__init__(**kwargs)
+            self.path = path
+
+        def get_content(self, default=None):
+            with open(self.path, "rb") as f:
+                return f.read()
+
+    if not os.path.isdir(input_folder):
+        return Err(f"not a folder: {input_folder}")
+
+    # scandir skips a per-entry stat, and rpartition only lowercases the
+    # extension instead of copying the whole name.
+    with os.scandir(input_folder) as it:
+        image_files = [
+            e.name
+            for e in it
+            if e.is_file() and e.name.rpartition(".")[2].lower() in _EXT_SET
+        ]
+
+    chapter_nodes = load_chapter_tree(config.get("chapters", []))
+    if not chapter_nodes:
+        return Err("config defines no chapters")
+    # One tuple up front keeps every later format_chapter_title call from
+    # re-wrapping the list for its cache key.
+    hierarchy_levels = tuple(config.get("hierarchy_levels", ("Volume", "Chapter")))
+
+    match assign_chapters_to_images(image_files, chapter_nodes):
+        case Err(error):
+            return Err(error)
+        case Ok(parsed_images):
+            pass
+
+    title = config.get("title") or os.path.basename(os.path.abspath(input_folder))
+    book = epub.EpubBook()
+    book.set_identifier(title)
+    book.set_title(title)
+    book.set_language("en")
+    book.add_author(config.get("author", "Unknown"))
+
+    chapters_with_info = []
+    chapter_images = []
+    pending_items = []
+    last_chapter_path = None
+    last_chapter_titles = None
+
+    # The Pillow work is CPU-bound and independent per page; fan it out
+    # across cores. Workers write the encoded JPEGs into the cache and hand
+    # back paths, so neither they nor the parent ever hold the whole book's
+    # bytes — the zip writer streams each file in at pack time.
+    paths = [os.path.join(input_folder, p.filename) for p in parsed_images]
+    cache_dir = _default_cache_dir()
+    os.makedirs(cache_dir, exist_ok=True)
+    try:
+        with ProcessPoolExecutor() as executor:
+            encode_image = partial(_encode_image, cache_dir=cache_dir)
+            encoded = iter(executor.map(encode_image, paths, chunksize=8))
+            # The first page doubles as the cover; peek it here and feed it
+            # back so the hot loop carries no per-page cover branch.
+            first_path = next(encoded)
+            with open(first_path, "rb") as f:
+                book.set_cover("cover.jpg", f.read(), create_page=False)
+            pages = zip(parsed_images, chain((first_path,), encoded))
+            for idx, (parsed_img, encoded_path) in enumerate(pages, 1):
+                if parsed_img.chapter_path != last_chapter_path and last_chapter_path is not None:
+                    chapter = create_chapter(
+                        book,
+                        chapter_images,
+                        last_chapter_path,
+                        last_chapter_titles,
+                        hierarchy_levels,
+                        len(chapters_with_info) + 1,
+                    )
+                    chapters_with_info.append((chapter, last_chapter_path, last_chapter_titles))
+                    chapter_images = []
+                last_chapter_path = parsed_img.chapter_path
+                last_chapter_titles = parsed_img.chapter_titles
+
+                img_file = f"{parsed_img.filename.rsplit('.', 1)[0]}.jpg"
+                epub_img = FileBackedItem(
+                    encoded_path,
+                    uid=f"img_{idx}",
+                    file_name=f"images/{img_file}",
+                    media_type="image/jpeg",
+                )
+                pending_items.append(epub_img)
+                chapter_images.append((parsed_img.filename, f"images/{img_file}"))
+
+        if chapter_images:
+            chapter = create_chapter(
+                book,
+                chapter_images,
+                last_chapter_path,
+                last_chapter_titles,
+                hierarchy_levels,
+                len(chapters_with_info) + 1,
+            )
+            chapters_with_info.append((chapter, last_chapter_path, last_chapter_titles))
+
+        # The image items carry explicit uids and media types, so add_item's
+        # per-call guessing is dead weight; extend the manifest in bulk.
+        book.items.extend(pending_items)
+
+        book.toc = build_toc_recursive(chapters_with_info, 0, hierarchy_levels)
+        book.add_item(epub.EpubNcx())
+        book.add_item(epub.EpubNav())
+        book.spine = ["nav", *[chapter for chapter, _, _ in chapters_with_info]]
+
+        epub.write_epub(output_path, book)
+    except OSError as exc:
+        # Unreadable/corrupt pages surface here from the pool workers (PIL's
+        # UnidentifiedImageError is an OSError), as do disk-full writes.
+        return Err(str(exc))
+    return Ok(output_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Bundle volume manga scans into an EPUB with a nested TOC."
+    )
+    parser.add_argument("input_folder", help="folder containing the page images")
+    parser.add_argument("config", help="TOML file describing the chapter hierarchy")
+    parser.add_argument("-o", "--output", help="output .epub path (default: <folder>.epub)")
+    args = parser.parse_args()
+
+    try:
+        with open(args.config, "rb") as f:
+            config = tomllib.load(f)
+    except (OSError, tomllib.TOMLDecodeError) as exc:
+        sys.stderr.write(f"error: {args.config}: {exc}\n")
+        sys.exit(1)
+
+    folder_name = os.path.basename(os.path.abspath(args.input_folder))
+    output_path = args.output or f"{folder_name}.epub"
+
+    match create_manga_epub(args.input_folder, output_path, config):
+        case Err(error):
+            sys.stderr.write(f"error: {error}\n")
+            sys.exit(1)
+        case Ok(path):
+            sys.stderr.write(f"Wrote {path}\n")
+
+
+if __name__ == "__main__":
+    main()
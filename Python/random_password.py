@@ -0,0 +1,46 @@
+"""Generate a random password with a given length.
+
+Python port of PowerShell/New-Password.ps1.
+
+Example1: python random_password.py
+Example2: python random_password.py --length 12
+Example3: python random_password.py --length 12 --punctuation '_*^@'
+"""
+
+import argparse
+import random
+import string
+
+# Printable ASCII, the same 33..126 range the PowerShell script draws from.
+_ALPHABET = tuple(chr(c) for c in range(33, 127))
+
+
+class RandomPassword:
+    @staticmethod
+    def generate(length, punctuation=None):
+        length = max(int(length), 8)
+        if punctuation is None:
+            alphabet = _ALPHABET
+        else:
+            extra = tuple(
+                dict.fromkeys(
+                    c for c in punctuation if 33 <= ord(c) <= 126 and not c.isalnum()
+                )
+            )
+            alphabet = tuple(string.ascii_letters + string.digits) + extra
+        # One C-level call draws every character; join allocates the result once.
+        return "".join(random.choices(alphabet, k=length))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a random password.")
+    parser.add_argument("-l", "--length", type=int, default=8, help="minimum 8")
+    parser.add_argument(
+        "-p", "--punctuation", help="only allow these punctuation characters"
+    )
+    args = parser.parse_args()
+    print(RandomPassword.generate(args.length, args.punctuation))
+
+
+if __name__ == "__main__":
+    main()